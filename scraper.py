@@ -1,40 +1,83 @@
 import re
-from urllib.parse import urlparse, urljoin, urldefrag, urlunparse
+import time
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin, urldefrag
 from urllib.robotparser import RobotFileParser
 import utils.response
-from bs4 import BeautifulSoup
-from collections import defaultdict
+from utils.download import download
+from collections import defaultdict, deque, Counter
+from functools import lru_cache
+from typing import Optional
+import numpy as np
+from xxhash import xxh64_intdigest
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:    # selectolax is much faster, but fall back to the standard library's parser if it isn't installed
+    LexborHTMLParser = None
+
+# a word = sequence of alphanumeric char (lowercase a-z AND digits 0-9)
+# translating the text bytes with this table lowercases A-Z and turns every other byte into a space,
+# so bytes.split() then yields the words in a single C-level scan, no regex engine involved
+_WORD_TABLE = bytes(byte if chr(byte).isascii() and chr(byte).isalnum() and not chr(byte).isupper()
+                    else byte + 32 if chr(byte).isascii() and chr(byte).isupper()
+                    else 32 for byte in range(256))
+# multipliers used to combine the hashes of 3 consecutive words into one 3-gram hash
+_GRAM_PRIME_1 = np.uint64(1_000_000_007)
+_GRAM_PRIME_2 = np.uint64(998_244_353)
+_SIMHASH_BITS = np.arange(64, dtype=np.uint64)
+# MinHash signature: each of the 128 slots keeps the min of (a * gram_hash + b) mod p over the page's 3 grams
+# (gram hashes are reduced mod p first and a, b < p = 2^31 - 1, so a * gram_hash + b < 2^62 never overflows uint64;
+# a and b must be drawn from the whole range, small a/b relative to p barely permute the grams and every slot
+# would end up picking the same few grams)
+_MINHASH_SIZE = 128
+_MINHASH_PRIME = np.uint64((1 << 31) - 1)
+_minhash_rng = np.random.default_rng(121)    # fixed seed so every run draws the same hash functions
+_MINHASH_A = _minhash_rng.integers(1, (1 << 31) - 1, size=(_MINHASH_SIZE, 1), dtype=np.uint64)
+_MINHASH_B = _minhash_rng.integers(0, (1 << 31) - 1, size=(_MINHASH_SIZE, 1), dtype=np.uint64)
+# patterns used by is_valid/extract_next_links on every url, compiled once at import
+_VALID_SCHEMES: frozenset[str] = frozenset(("http", "https"))
+# splits an absolute url into scheme, netloc, path and query in one pass (is_valid/_canonicalize do not need urlparse)
+_URL_RE = re.compile(r"([a-zA-Z][a-zA-Z0-9+.-]*)://([^/?#]*)([^?#]*)\??([^#]*)")
+# the remaining checks were .*-prefixed regexes, which are just suffix/substring tests done in C by str methods
+_DOMAIN_SUFFIXES: tuple[str, ...] = (".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu")
+# file extensions that are never worth crawling, checked against the suffix after the last '.' in the path
+_BAD_EXTS: frozenset[str] = frozenset({'css', 'js', 'bmp', 'gif', 'jpg', 'jpeg', 'jpe', 'ico', 'png', 'tif', 'tiff',
+    'mid', 'mp2', 'mp3', 'mp4', 'wav', 'avi', 'mov', 'mpeg', 'ram', 'm4v', 'mkv', 'ogg', 'ogv', 'pdf', 'ps', 'eps', 'tex',
+    'ppt', 'pptx', 'doc', 'docx', 'xls', 'xlsx', 'names', 'data', 'dat', 'exe', 'bz2', 'tar', 'msi', 'bin', '7z', 'psd',
+    'dmg', 'iso', 'epub', 'dll', 'cnf', 'tgz', 'sha1', 'thmx', 'mso', 'arff', 'rtf', 'jar', 'csv', 'rm', 'smil', 'wmv',
+    'swf', 'wma', 'zip', 'rar', 'gz', 'java', 'war', 'mpg', 'ppsx'})
 
 class Scraper:
     visited_pages: set[str] = set()    # set of all unique urls visited
     num_redirect: int = 0    # number of urls visited that redirected
     pages_in_front: set[str] = set()    # pages that are in frontier, in a set for O(1) lookup
     longest_page: tuple[str, int] = ("", -1)    # (url, num words)
-    word_count: defaultdict[str, int] = defaultdict(int)    # dict[word] = count
+    word_count: Counter[bytes] = Counter()    # dict[word] = count
     ics_subdomains: defaultdict[str, int] = defaultdict(int)    # dict[ics subdomain] = num unique pages
-    all_fingerprints: list[set[int]] = []    # all fingerprints
-    robot_allowed: dict[str, bool] = defaultdict(bool)
-    ENGLISH_STOPWORDS: set[str] = {'a', 'about', 'above', 'after', 'again', 'against',  'all', 'am', 'an', 
-        'and', 'any', 'are', "aren't", 'as',  'at', 'be', 'because', 'been', 'before', 'being', 'below', 'between', 
-        'both', 'but', 'by', "can't", 'cannot', 'could', "couldn't", 'did', "didn't", 'do', 'does', "doesn't", 'doing', 
-        "don't", 'down', 'during', 'each', 'few', 'for', 'from', 'further', 'had', "hadn't", 'has', "hasn't", 'have', 
-        "haven't", 'having', 'he', "he'd", "he'll", "he's", 'her', 'here', "here's", 'hers', 'herself', 'him', 'himself', 
-        'his', 'how', "how's", 'i', "i'd", "i'll", "i'm", "i've", 'if', 'in', 'into', 'is', "isn't", 'it', "it's", 'its', 
-        'itself', "let's", 'me', 'more', 'most', "mustn't", 'my', 'myself', 'no', 'nor', 'not', 'of', 'off', 'on', 'once', 
-        'only', 'or', 'other', 'ought', 'our', 'ours', 'ourselves', 'out', 'over', 'own', 'same', "shan't", 'she', "she'd", 
-        "she'll", "she's", 'should', "shouldn't", 'so', 'some', 'such', 'than', 'that', "that's", 'the', 'their', 'theirs', 
-        'them', 'themselves', 'then', 'there', "there's", 'these', 'they', "they'd", "they'll", "they're", "they've", 'this', 
-        'those', 'through', 'to', 'too', 'under', 'until', 'up', 'very', 'was', "wasn't", 'we', "we'd", "we'll", "we're", 
-        "we've", 'were', "weren't", 'what', "what's", 'when', "when's", 'where', "where's", 'which', 'while', 'who', "who's", 
-        'whom', 'why', "why's", 'with', "won't", 'would', "wouldn't", 'you', "you'd", "you'll", "you're", "you've", 'your', 
-        'yours', 'yourself', 'yourselves'}
+    robot_parsers: dict[str, Optional[RobotFileParser]] = {}    # dict[robots.txt url] = its parser (None if unreadable)
+    ENGLISH_STOPWORDS: frozenset[bytes] = frozenset(word.encode() for word in {'a', 'about', 'above', 'after', 'again',
+        'against', 'all', 'am', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'because', 'been', 'before', 'being',
+        'below', 'between', 'both', 'but', 'by', 'cannot', 'could', 'did', 'do', 'does', 'doing', 'down', 'during',
+        'each', 'few', 'for', 'from', 'further', 'had', 'has', 'have', 'having', 'he', 'her', 'here', 'hers',
+        'herself', 'him', 'himself', 'his', 'how', 'i', 'if', 'in', 'into', 'is', 'it', 'its', 'itself', 'me', 'more',
+        'most', 'my', 'myself', 'no', 'nor', 'not', 'of', 'off', 'on', 'once', 'only', 'or', 'other', 'ought', 'our',
+        'ours', 'ourselves', 'out', 'over', 'own', 'same', 'she', 'should', 'so', 'some', 'such', 'than', 'that',
+        'the', 'their', 'theirs', 'them', 'themselves', 'then', 'there', 'these', 'they', 'this', 'those', 'through',
+        'to', 'too', 'under', 'until', 'up', 'very', 'was', 'we', 'were', 'what', 'when', 'where', 'which', 'while',
+        'who', 'whom', 'why', 'with', 'would', 'you', 'your', 'yours', 'yourself', 'yourselves'})    # bytes to match page tokens, no contractions (never tokenized)
     PAGE_MIN_SIZE: int = 250    # min number of words a page should have
     PAGE_MAX_SIZE: int = 10_000    # max number of words a page should have
+    WORD_COUNT_PRUNE_SIZE: int = 1_000_000    # once word_count has this many distinct words, words seen only once are dropped
+    word_count_prune_at: int = WORD_COUNT_PRUNE_SIZE    # size that triggers the next prune, raised after every prune
     PAGE_SIMILARITY_THRESHOLD = 0.9    # threshold for two pages to be 'similar'
     TRAP_FINGERPRINT_CHECK = 25    # how many recent previous pages to compare against for traps/cycles
+    SIMHASH_PREFILTER_DISTANCE = 20    # pages whose SimHashes differ in more bits than this are never near duplicates
+    all_fingerprints: deque[tuple[int, np.ndarray]] = deque(maxlen=TRAP_FINGERPRINT_CHECK)    # fingerprints of the most recent pages
 
-    def __init__(self) -> None:
-        pass
+    def __init__(self, config, logger=None) -> None:
+        # robots.txt files are downloaded through the cache server like every other page, which needs the config
+        self.config = config
+        self.logger = logger
         
     def scraper(self, url: str, resp: utils.response.Response) -> list[str]:
         # This function needs to return a list of urls that are scraped from the response.
@@ -43,8 +86,8 @@ class Scraper:
         # These urls have to be filtered so that urls that do not have to be downloaded are not added to the frontier.
         # The first step of filtering the urls can be by using the is_valid function provided in the same scraper.py file. 
         # Additional rules should be added to the is_valid function to filter the urls.
-        links = self.extract_next_links(url, resp)
-        return [link for link in links if is_valid(link)]
+        # extract_next_links only returns links that already passed is_valid, no need to filter them twice
+        return self.extract_next_links(url, resp)
 
     def extract_next_links(self, url: str, resp: utils.response.Response) -> list[str]:
         # Implementation required.
@@ -58,75 +101,81 @@ class Scraper:
         # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
 
         # parse the url and do basic checks to confirm validity of url
-        defrag_url = urldefrag(resp.url.lower()).url
-        parsed_url = urlparse(defrag_url, allow_fragments=False)
-        no_scheme_url = parsed_url.netloc + urlunparse(("", "", parsed_url.path, parsed_url.params, parsed_url.query, ""))
+        resp_url, orig_url = resp.url.lower(), url.lower()    # lowercase both once, they are used several times
+        defrag_url, netloc, no_scheme_url = _canonicalize(resp_url)
         # verify the download request went through properply and the website itself is valid 
         if not resp or resp.status not in [200, 301, 302, 307, 308] or not resp.raw_response \
            or no_scheme_url in Scraper.visited_pages or not is_valid(defrag_url):
             return list()
 
         # check robots
-        if not self.check_robots_txt(resp.url.lower()):
+        if not self.check_robots_txt(resp_url):
             return list()
         
         # after basic checks, mark the link as 'visited' and update ics subdomain tracker
         Scraper.visited_pages.add(no_scheme_url)
         Scraper.pages_in_front.discard(no_scheme_url)
-        if re.match(r".*\.ics\.uci\.edu", parsed_url.netloc) or parsed_url.netloc == "ics.uci.edu":
-            Scraper.ics_subdomains[parsed_url.netloc] += 1
+        if ".ics.uci.edu" in netloc or netloc == "ics.uci.edu":
+            Scraper.ics_subdomains[netloc] += 1
 
-        # referenced https://www.geeksforgeeks.org/beautifulsoup-scraping-link-from-html/ for bs4 usage
-        # referenced https://medium.com/quantrium-tech/extracting-words-from-a-string-in-python-using-regex-dac4b385c1b8 for extracting words using re
-        
-        # parse the page for text and perfrom further validity tests on the page before extracting urls
-        soup = BeautifulSoup(resp.raw_response.content, "html.parser")
-        page_words = re.findall("[a-z0-9]+", soup.get_text().lower())    # define a word = sequence of alphanumeric char (lowercase a-z AND digits 0-9)
-        if not self.page_is_valid_size(page_words):
+        # every word takes at least 1 byte with at least 1 byte between words, so smaller pages can't reach
+        # PAGE_MIN_SIZE words and are rejected here without parsing them
+        if len(resp.raw_response.content) < 2 * Scraper.PAGE_MIN_SIZE - 1:
+            return list()
+
+        # parse the page for its words, fingerprint and links (see _parse_page)
+        page_length, page_count, page_fingerprint, page_links = _parse_page(resp.raw_response.content, defrag_url)
+        if page_fingerprint is None:    # page is not a valid size
             return list()
         
         # check for trap and similarity using page fingerprint method from lecture
-        page_fingerprint = self.create_fingerprint(page_words)
         if self.check_for_recent_trap(page_fingerprint):
             return list()
         Scraper.all_fingerprints.append(page_fingerprint)
 
         # update counting stats 
-        self.update_longest_page_and_word_count(page_words, resp.url.lower())
+        self.update_longest_page_and_word_count(page_length, page_count, resp_url)
 
-        # extract urls from the page to add them to the frontier
+        # add the urls extracted from the page to the frontier
+        # (the sets are bound to locals once, instead of looking them up on the class for every link)
         next_links = []
-        for link in soup.find_all("a"):
-            new_url = urljoin(resp.url.lower(), link.get("href")).lower()    # turn relative url to absolute if needed;
-            new_url = urldefrag(new_url).url
-            new_parsed_url = urlparse(new_url, allow_fragments=False)
-            new_no_scheme_url = new_parsed_url.netloc + urlunparse(("", "", new_parsed_url.path, new_parsed_url.params, new_parsed_url.query, ""))
-            if new_url and is_valid(new_url) and self.check_robots_txt(new_url) \
-               and new_no_scheme_url not in Scraper.visited_pages \
-               and new_no_scheme_url not in Scraper.pages_in_front:
+        visited_pages, pages_in_front = Scraper.visited_pages, Scraper.pages_in_front
+        for new_url in page_links:
+            _, _, new_no_scheme_url = _canonicalize(new_url)
+            # cheapest checks first: robots.txt (a download for a new domain) is only checked for new, valid links
+            if new_url and is_valid(new_url) \
+               and new_no_scheme_url not in visited_pages \
+               and new_no_scheme_url not in pages_in_front \
+               and self.check_robots_txt(new_url):
                 next_links.append(new_url)
-                Scraper.pages_in_front.add(new_no_scheme_url)
+                pages_in_front.add(new_no_scheme_url)
 
         # check for redirect, url = original url | resp.url = redirected url
-        if url.lower() != resp.url.lower():
-            old_url_defrag = urldefrag(url.lower()).url
-            old_parsed_url = urlparse(old_url_defrag, allow_fragments=False)
-            old_no_scheme_url = old_parsed_url.netloc + urlunparse(("", "", old_parsed_url.path, old_parsed_url.params, old_parsed_url.query, ""))
-            Scraper.visited_pages.add(old_no_scheme_url)
-            Scraper.num_redirect += 1
+        if orig_url != resp_url:
+            _, _, old_no_scheme_url = _canonicalize(orig_url)
+            # urls that only differ by scheme/fragment share a key, only count a redirect if it added a new key
+            Scraper.pages_in_front.discard(old_no_scheme_url)
+            if old_no_scheme_url not in Scraper.visited_pages:
+                Scraper.visited_pages.add(old_no_scheme_url)
+                Scraper.num_redirect += 1
 
         return next_links
     
-    def update_longest_page_and_word_count(self, words: list[str], url: str) -> None:
-        # first update longest page (do not filter stopwords)
-        if len(words) > Scraper.longest_page[1]:
-            Scraper.longest_page = (url, len(words))
-        # next, update word count (filter out stopwords)
-        for word in words:
-            if word not in Scraper.ENGLISH_STOPWORDS:
-                Scraper.word_count[word] += 1
-
-    def page_is_valid_size(self, words: list[str]) -> bool:
+    def update_longest_page_and_word_count(self, page_length: int, page_count: Counter[bytes], url: str) -> None:
+        # first update longest page (page_length counts stopwords too)
+        if page_length > Scraper.longest_page[1]:
+            Scraper.longest_page = (url, page_length)
+        # next, update word count (page_count was already counted and stripped of stopwords by _parse_page)
+        Scraper.word_count.update(page_count)
+        # keep the vocabulary bounded, one-off tokens (ids, hashes, typos) can never reach the top 50 words
+        # the next prune only happens once word_count has doubled again, otherwise a vocabulary of words that were
+        # all seen twice or more would stay above the limit and be rebuilt for every page
+        if len(Scraper.word_count) > Scraper.word_count_prune_at:
+            Scraper.word_count = Counter({word: count for word, count in Scraper.word_count.items() if count > 1})
+            Scraper.word_count_prune_at = max(Scraper.WORD_COUNT_PRUNE_SIZE, 2 * len(Scraper.word_count))
+
+    @staticmethod
+    def page_is_valid_size(words: list[bytes]) -> bool:
         # return whether the number of words in the page is in a predefined interval
         return Scraper.PAGE_MIN_SIZE <= len(words) and \
                len(words) <= Scraper.PAGE_MAX_SIZE
@@ -139,103 +188,185 @@ class Scraper:
             file.write(f"Total unique pages found = {len(Scraper.visited_pages) - Scraper.num_redirect}\n\n")
             file.write(f"Longest page = {Scraper.longest_page[0]} with {Scraper.longest_page[1]} words\n\n")
             file.write(f"Top 50 most common words (excluding stop words):\n")
-            for key, value in (sorted(Scraper.word_count.items(), key=lambda item: item[1]))[:50]:
-                file.write(f"\t{key}\n")
+            for key, value in Scraper.word_count.most_common(50):    # heapq.nlargest under the hood, no full sort
+                file.write(f"\t{key.decode()}\n")
             file.write("\n")
             file.write(f"ics.uci.edu Subdomains:\n")
             for key, value in sorted(Scraper.ics_subdomains.items(), key=lambda item: (item[0], item[1])):
                 file.write(f"\thttp://{key}, {value}\n")
 
-    def create_fingerprint(self, words: list[str]) -> set[int]:
+    @staticmethod
+    def create_fingerprint(words: list[bytes]) -> tuple[int, np.ndarray]:
         # based on procedure seen in lecture
-        # create 3 grams
-        three_grams = (words[i:i+3] for i in range(len(words)-2))
-        # calculate hash values of 3 grams
-        three_gram_hashes = (hash(tuple(gram)) for gram in three_grams)
-        # select hash values using mod 4
-        return set(gram_hash for gram_hash in three_gram_hashes if gram_hash % 4 == 0)
-
-    def fingerprints_are_similar(self, fingerprint_1: set[int], fingerprint_2: set[int]) -> bool:
-        # similar if intersection(fingerprints) / union(fingerprints) >= threshold
-        intersection = fingerprint_1 & fingerprint_2
-        union = fingerprint_1 | fingerprint_2
-        if union:
-            similarity = len(intersection) / len(union) 
-        else:
-            similarity = int(len(intersection) == len(union))
+        # hash every distinct word once, then lay the page out as an array of 64 bit word hashes
+        # (xxhash rather than hash(), which is salted differently on every run)
+        word_hashes = {word: xxh64_intdigest(word) for word in set(words)}
+        hashes = np.fromiter((word_hashes[word] for word in words), dtype=np.uint64, count=len(words))
+        # calculate hash values of all 3 grams at once (overflow just wraps around, which is fine for hashing)
+        three_gram_hashes = hashes[:-2] * _GRAM_PRIME_1 + hashes[1:-1] * _GRAM_PRIME_2 + hashes[2:]
+        grams = np.unique(three_gram_hashes)
+        if not grams.size:
+            return 0, np.full(_MINHASH_SIZE, _MINHASH_PRIME, dtype=np.uint64)
+        # 64 bit SimHash: each bit is set if it is set in the majority of the 3 gram hashes (cheap similarity prefilter)
+        bit_votes = ((grams[:, np.newaxis] >> _SIMHASH_BITS) & np.uint64(1)).sum(axis=0)
+        simhash = int(((bit_votes * 2 > grams.size).astype(np.uint64) << _SIMHASH_BITS).sum())
+        # keep a fixed size MinHash signature of the 3 gram hashes instead of a variable size set
+        grams %= _MINHASH_PRIME
+        return simhash, ((_MINHASH_A * grams + _MINHASH_B) % _MINHASH_PRIME).min(axis=1)
+
+    def fingerprints_are_similar(self, fingerprint_1: tuple[int, np.ndarray], fingerprint_2: tuple[int, np.ndarray]) -> bool:
+        # pages whose SimHashes are far apart can't be near duplicates, skip the MinHash comparison for them
+        if bin(fingerprint_1[0] ^ fingerprint_2[0]).count("1") > Scraper.SIMHASH_PREFILTER_DISTANCE:
+            return False
+        # the fraction of matching MinHash slots estimates intersection(3 grams) / union(3 grams), similar if >= threshold
+        similarity = np.count_nonzero(fingerprint_1[1] == fingerprint_2[1]) / _MINHASH_SIZE
         return similarity >= Scraper.PAGE_SIMILARITY_THRESHOLD
     
-    def check_for_recent_trap(self, fingerprint: set[int]) -> bool:
-        # only start checking for traps once enough fingerprints have been stored
-        if len(Scraper.all_fingerprints) <= Scraper.TRAP_FINGERPRINT_CHECK:
-            return False
+    def check_for_recent_trap(self, fingerprint: tuple[int, np.ndarray]) -> bool:
         # compare fingerprint arg to recent fingerprints for their similarity
-        start_index_incl = len(Scraper.all_fingerprints)-2
-        end_index_excl = len(Scraper.all_fingerprints)-2-Scraper.TRAP_FINGERPRINT_CHECK
-        for i in range(start_index_incl, end_index_excl, -1):
-            if self.fingerprints_are_similar(fingerprint, Scraper.all_fingerprints[i]):
-                return True
-        return False
+        # (all_fingerprints only ever holds the last TRAP_FINGERPRINT_CHECK pages)
+        return any(self.fingerprints_are_similar(fingerprint, recent_fingerprint)
+                   for recent_fingerprint in Scraper.all_fingerprints)
 
     def check_robots_txt(self, url: str) -> bool:
         # returns whether the crawling can crawl the website
         # determined by checking robots.txt
         # perform robots.txt check - referenced https://docs.python.org/3/library/urllib.robotparser.html for help
         try:
-            defrag_url = urldefrag(url.lower())
-            parsed_url = urlparse(defrag_url, allow_fragments=False)
-            # first check if we already checked robots.txt for this domain
-            robot_url = urlunparse((parsed_url.scheme, parsed_url.netloc, "/robots.txt", "", "", ""))
-            if robot_url in Scraper.robot_allowed and not Scraper.robot_allowed[robot_url]:
-                return False
-            # read robots.txt and save whether we are allowed to
-            rfp = RobotFileParser()
-            rfp.set_url(robot_url)
-            rfp.read()
-            robot_can_read = rfp.can_fetch("IR US24 70346322", defrag_url)
-            Scraper.robot_allowed[robot_url] = robot_can_read
-            if not robot_can_read:
-                return False
+            defrag_url, netloc, _ = _canonicalize(url.lower())
+            robot_url = f"{defrag_url.partition(':')[0]}://{netloc}/robots.txt"
+            # robots.txt is only downloaded and parsed the first time a domain is seen, later urls reuse the parser
+            # (never fetched directly from the ics servers, it goes through the cache server like any other page)
+            if robot_url not in Scraper.robot_parsers:
+                rfp = None    # robots.txt can't be read, don't block the whole domain because of it
+                try:
+                    resp = download(robot_url, self.config, self.logger)
+                    if resp.status == 200 and resp.raw_response:
+                        rfp = RobotFileParser(robot_url)
+                        rfp.parse(resp.raw_response.content.decode("utf-8", "replace").splitlines())
+                    elif resp.status in (401, 403):    # same as RobotFileParser.read(): access denied = disallow all
+                        rfp = RobotFileParser(robot_url)
+                        rfp.disallow_all = True
+                    # other 4xx (no robots.txt) and failed downloads stay None, i.e. everything is allowed
+                except Exception:
+                    pass
+                finally:
+                    time.sleep(self.config.time_delay)    # same politeness delay the worker waits after each download
+                Scraper.robot_parsers[robot_url] = rfp
+            rfp = Scraper.robot_parsers[robot_url]
+            return rfp is None or rfp.can_fetch(self.config.user_agent, defrag_url)
         except Exception:
-            pass
-        except:
-            return False
-        return True
+            return True
 
 
+@lru_cache(maxsize=100_000)    # like is_valid, mostly called on links that were already seen on other pages
+def _canonicalize(url: str) -> tuple[str, str, str]:
+    # split the url once and return (url without its fragment, netloc, key used by visited_pages/pages_in_front)
+    # the key is the url without scheme and fragment: netloc + path (incl. params) + query
+    # _URL_RE gives the same pieces as urlsplit for absolute urls without building a SplitResult
+    match = _URL_RE.match(url)
+    if match is None:
+        parts = urlsplit(url)
+        netloc, path, query = parts.netloc, parts.path, parts.query
+    else:
+        _, netloc, path, query = match.groups()
+    return url.partition("#")[0], netloc, netloc + path + ("?" + query if query else "")
+
+
+class _FallbackPageParser(HTMLParser):
+    # standard library parser used when selectolax is not installed, collects <a> hrefs and the page text
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.hrefs: list[str] = []
+        self.text: list[str] = []
+        self.skip_depth: int = 0    # > 0 while inside <script>/<style>, whose text is not page text
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+        elif tag == "script" or tag == "style":
+            self.skip_depth += 1
+        self.text.append(" ")    # tags separate words, text inside one tag can arrive in several pieces
+
+    def handle_endtag(self, tag: str) -> None:
+        if (tag == "script" or tag == "style") and self.skip_depth:
+            self.skip_depth -= 1
+        self.text.append(" ")
+
+    def handle_data(self, data: str) -> None:
+        if not self.skip_depth:
+            self.text.append(data)
+
+
+def _parse_page(content: bytes, url: str) -> tuple[int, Counter[bytes], Optional[tuple[int, np.ndarray]], list[str]]:
+    # returns the page's number of words, its word counts without stopwords,
+    # its fingerprint (None if the page is not a valid size) and the defragmented absolute urls it links to
+    # referenced https://medium.com/quantrium-tech/extracting-words-from-a-string-in-python-using-regex-dac4b385c1b8 for extracting words using re
+
+    # parse the page and pull out its hrefs and text (script/style contents are not page text)
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(content)
+        hrefs = [link.attributes.get("href") for link in tree.css("a[href]")]
+        tree.strip_tags(["script", "style"])
+        text = tree.root.text(separator=" ") if tree.root else ""
+    else:
+        fallback_parser = _FallbackPageParser()
+        fallback_parser.feed(content.decode("utf-8", "replace"))
+        fallback_parser.close()
+        hrefs, text = fallback_parser.hrefs, "".join(fallback_parser.text)
+    page_words = text.encode().translate(_WORD_TABLE).split()
+    if not Scraper.page_is_valid_size(page_words):
+        return 0, Counter(), None, []
+    # nav bars and footers repeat the same hrefs, so each distinct href/link is only handled and sent back once
+    page_links: dict[str, None] = {}
+    for href in dict.fromkeys(hrefs):
+        if not href:
+            continue
+        new_url = urljoin(url, href).lower()    # turn relative url to absolute if needed;
+        page_links[urldefrag(new_url).url] = None
+    # count the page in one C-level pass, then drop stopwords from the (much smaller) page counter
+    # (intersecting the key view with the stopword set only visits the stopwords that are actually on the page)
+    page_count = Counter(page_words)
+    for stopword in page_count.keys() & Scraper.ENGLISH_STOPWORDS:
+        del page_count[stopword]
+    return len(page_words), page_count, Scraper.create_fingerprint(page_words), list(page_links)
+
+
+@lru_cache(maxsize=100_000)    # the same links (nav bars, footers) show up on many pages
 def is_valid(url) -> bool:
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
     # There are already some conditions that return False.
     try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
+        match = _URL_RE.match(url)
+        if not match:
+            return False
+        scheme, netloc, path, query = match.groups()
+        if scheme.lower() not in _VALID_SCHEMES:
             return False
-        # check if url is in the domain (https://regexr.com/ helped me figure out the right expression)
-        if not re.match(r".*\.(ics|cs|informatics|stat)\.uci\.edu$", parsed.netloc):
+        # check if url is in the domain (https://regexr.com/ helped me figure out the right expression, now a suffix test)
+        if not netloc.endswith(_DOMAIN_SUFFIXES):
             return False
+        # like urlparse, leave the ;params of the last path segment out of the path
+        params_start = path.rfind(";")
+        if params_start > path.rfind("/"):
+            path = path[:params_start]
         # if re.match(r"\/doku\.php\/.*", parsed.path):
         #     return False
         # if re.match(r"\/~eppstein\/pix\/.*", parsed.path):
         #     return False
         # if re.match(r".*grape\.ics\.uci\.edu.*", parsed.netloc):
         #     return False
-        if re.match(r".*\/pdf.*", parsed.path):    # ignore pdfs
+        if "/pdf" in path:    # ignore pdfs
             return False
-        if "diff" in parsed.query and "rev" in parsed.query:    # ignore repository revisions (specifically on doku.php)
+        if "diff" in query and "rev" in query:    # ignore repository revisions (specifically on doku.php)
             return False
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz"
-            + r"|java|war|jar|mpg|ppsx"
-            + r"|pdf|ppt|pptx|doc|docx|css|js)$", parsed.path.lower())
+        # only the extension needs lowercasing, not the whole path
+        dot = path.rfind(".")
+        return dot < 0 or path[dot+1:].lower() not in _BAD_EXTS
 
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
@@ -2,11 +2,18 @@ import requests
 import cbor
 import time
 
+from requests.adapters import HTTPAdapter
+
 from utils.response import Response
 
+# Every download goes to the same cache server, so keep the connections
+# alive and reuse them across requests (and worker threads).
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_maxsize=100))
+
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
+    resp = _session.get(
         f"http://{host}:{port}/",
         params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
     try: